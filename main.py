@@ -1,16 +1,23 @@
-import json
+import asyncio
 import random
-import re
 import base64
 import logging
 from typing import Optional, List, Dict, Any, Union
 import os
-import random
-
-import requests
+import secrets
+import socket
+import time
+import types
+from collections import OrderedDict
+from urllib.parse import quote
+
+import httpx
+import orjson
+import redis.asyncio as redis
 from fastapi import FastAPI, Query, HTTPException, Depends, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from pydantic import BaseModel
 
 # Set up logging
@@ -23,7 +30,8 @@ logger = logging.getLogger("netfree_api")
 app = FastAPI(
     title="NetFree API",
     description="API to fetch content from netfree2.cc",
-    version="1.0.2"
+    version="1.0.2",
+    default_response_class=ORJSONResponse
 )
 
 # Add CORS middleware
@@ -35,6 +43,20 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Raw upstream bodies are often already-compressed media and must reach the client unbuffered
+GZIP_EXCLUDED_PATHS = ('/stream/',)
+
+class APIGZipMiddleware(GZipMiddleware):
+    """GZipMiddleware that passes excluded paths through uncompressed"""
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and scope['path'].startswith(GZIP_EXCLUDED_PATHS):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+# Compress responses for clients that accept gzip
+app.add_middleware(APIGZipMiddleware, minimum_size=1024)
+
 # Response models
 class StatusModel(BaseModel):
     code: int
@@ -71,9 +93,9 @@ class HLSResponse(BaseModel):
 # Middleware to log all requests
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
-    logger.info(f"Request: {request.method} {request.url}")
+    logger.info("Request: %s %s", request.method, request.url)
     response = await call_next(request)
-    logger.info(f"Response status: {response.status_code}")
+    logger.info("Response status: %s", response.status_code)
     return response
 
 # List of common user agents to rotate through
@@ -85,23 +107,180 @@ USER_AGENTS = [
     'Mozilla/5.0 (iPhone; CPU iPhone OS 17_4 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.0 Mobile/15E148 Safari/604.1'
 ]
 
-# Cookie store - in a production environment, this should be in a database or Redis
-# For simplicity, we'll store them in memory in this example
+DEFAULT_COOKIE = 'user_token=c4e606ec3f66b93e8198a48c8c71e6b8; t_hash_t=4184321d319f63c93cff4c7588764623%3A%3A14b66f534e8c2fa68723668dead845ce%3A%3A1746367568%3A%3Ani; recentplay=81688854; 81688854=95%3A7065'
+
+# Per-process cookie store - shared through Redis below when REDIS_URL is set
 COOKIES_CACHE = {
-    'default': 'user_token=c4e606ec3f66b93e8198a48c8c71e6b8; t_hash_t=4184321d319f63c93cff4c7588764623%3A%3A14b66f534e8c2fa68723668dead845ce%3A%3A1746367568%3A%3Ani; recentplay=81688854; 81688854=95%3A7065'
+    'default': DEFAULT_COOKIE
 }
 
+PLAYLIST_HOST = 'netfree2.cc'
+PLAYLIST_PATH = '/playlist.php'
+
+# Static headers for playlist requests, built once; only the Cookie varies per call
+PLAYLIST_HEADERS = types.MappingProxyType({
+    'Accept': '*/*',
+    'Accept-Encoding': 'gzip, deflate, br',
+    'Accept-Language': 'en-US,en;q=0.5',
+    'DNT': '1',
+    'Host': 'netfree2.cc',
+    'Referer': 'https://netfree2.cc/home',
+    'Sec-Fetch-Dest': 'empty',
+    'Sec-Fetch-Mode': 'cors',
+    'Sec-Fetch-Site': 'same-origin',
+    'TE': 'trailers',
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:124.0) Gecko/20100101 Firefox/124.0'
+})
+
+# Response cache - shared through Redis when REDIS_URL is set, otherwise a per-process LRU
+REDIS_URL = os.environ.get("REDIS_URL")
+REDIS = redis.Redis.from_url(REDIS_URL) if REDIS_URL else None
+PLAYLIST_CACHE_TTL = int(os.environ.get("PLAYLIST_CACHE_TTL", 300))
+LOCAL_CACHE_SIZE = 256
+LOCAL_CACHE: "OrderedDict[str, tuple]" = OrderedDict()
+
+async def cache_get(key: str):
+    if REDIS is not None:
+        try:
+            cached = await REDIS.get(key)
+            return orjson.loads(cached) if cached is not None else None
+        except redis.RedisError as e:
+            logger.warning("Redis get failed, falling back to local cache: %s", e)
+
+    entry = LOCAL_CACHE.get(key)
+    if entry is None:
+        return None
+    expires_at, value = entry
+    if expires_at < time.monotonic():
+        del LOCAL_CACHE[key]
+        return None
+    LOCAL_CACHE.move_to_end(key)
+    return value
+
+async def cache_set(key: str, value, ttl: int):
+    if REDIS is not None:
+        try:
+            await REDIS.set(key, orjson.dumps(value), ex=ttl)
+            return
+        except redis.RedisError as e:
+            logger.warning("Redis set failed, falling back to local cache: %s", e)
+
+    LOCAL_CACHE[key] = (time.monotonic() + ttl, value)
+    LOCAL_CACHE.move_to_end(key)
+    while len(LOCAL_CACHE) > LOCAL_CACHE_SIZE:
+        LOCAL_CACHE.popitem(last=False)
+
+# Outbound sockets skip Nagle's delay and keep idle pooled connections alive
+SOCKET_OPTIONS = [
+    (socket.IPPROTO_TCP, socket.TCP_NODELAY, 1),
+    (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+]
+
+def build_transport(max_connections: int, max_keepalive_connections: int, proxy: Optional[str] = None):
+    return httpx.AsyncHTTPTransport(
+        proxy=proxy,
+        http2=True,
+        retries=0,
+        socket_options=SOCKET_OPTIONS,
+        # Pooled connections are reused until the peer closes them
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=None
+        )
+    )
+
+# Shared async client for direct (non-proxied) calls; its cookie jar holds the cookies of
+# the refresh in progress and is emptied at the start of every refresh
+CLIENT = httpx.AsyncClient(transport=build_transport(100, 50), timeout=10.0)
+CLIENT_COOKIES_LOCK = asyncio.Lock()
+
+# Shared cookie pool - when Redis is configured every worker reads the same cookies and
+# only the worker holding the lock refreshes them, the others wait for its notification
+COOKIES_REDIS_KEY = "netfree:cookies:latest"
+COOKIES_LOCK_KEY = "netfree:cookies:lock"
+COOKIES_CHANNEL = "netfree:cookies:refreshed"
+COOKIES_TTL = 3600
+COOKIES_LOCK_TTL = 30
+RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+async def get_latest_cookies() -> Optional[str]:
+    if REDIS is not None:
+        try:
+            cookies = await REDIS.get(COOKIES_REDIS_KEY)
+            if cookies is not None:
+                return cookies.decode('utf-8')
+        except redis.RedisError as e:
+            logger.warning("Redis cookie lookup failed, using local cookies: %s", e)
+    return COOKIES_CACHE.get('latest')
+
+async def store_latest_cookies(cookie_string: str):
+    COOKIES_CACHE['latest'] = cookie_string
+    if REDIS is not None:
+        try:
+            await REDIS.set(COOKIES_REDIS_KEY, cookie_string, ex=COOKIES_TTL)
+            await REDIS.publish(COOKIES_CHANNEL, "refreshed")
+        except redis.RedisError as e:
+            logger.warning("Failed to publish cookies to Redis: %s", e)
+
+async def wait_for_cookie_refresh() -> Optional[str]:
+    """Wait until the worker holding the refresh lock publishes new cookies"""
+    pubsub = REDIS.pubsub()
+    try:
+        await pubsub.subscribe(COOKIES_CHANNEL)
+        deadline = time.monotonic() + COOKIES_LOCK_TTL
+        # Re-check the lock each second in case the refresh finished before we subscribed
+        while time.monotonic() < deadline and await REDIS.exists(COOKIES_LOCK_KEY):
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            if message is not None:
+                break
+    finally:
+        await pubsub.aclose()
+    return await get_latest_cookies()
+
 async def get_fresh_cookies():
+    """Function to get fresh cookies, refreshing them at most once across all workers"""
+    if REDIS is None:
+        return await fetch_cookies()
+
+    lock_token = secrets.token_hex(8)
+    try:
+        acquired = await REDIS.set(COOKIES_LOCK_KEY, lock_token, nx=True, ex=COOKIES_LOCK_TTL)
+    except redis.RedisError as e:
+        logger.warning("Failed to take cookie refresh lock, refreshing locally: %s", e)
+        return await fetch_cookies()
+
+    if not acquired:
+        logger.info("Another worker is refreshing cookies, waiting for it")
+        try:
+            return await wait_for_cookie_refresh() or COOKIES_CACHE['default']
+        except redis.RedisError as e:
+            logger.warning("Failed waiting for cookie refresh: %s", e)
+            return COOKIES_CACHE['default']
+
+    try:
+        return await fetch_cookies()
+    finally:
+        try:
+            # Compare-and-delete in one step so a lock re-taken after our TTL expired survives
+            await REDIS.eval(RELEASE_LOCK_SCRIPT, 1, COOKIES_LOCK_KEY, lock_token)
+        except redis.RedisError as e:
+            logger.warning("Failed to release cookie refresh lock: %s", e)
+
+async def fetch_cookies():
     """Function to get fresh cookies from the site"""
     try:
-        session = requests.Session()
         # Use a random user agent
         headers = {
             'User-Agent': random.choice(USER_AGENTS),
             'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8',
             'Accept-Language': 'en-US,en;q=0.5',
             'Accept-Encoding': 'gzip, deflate, br',
-            'Connection': 'keep-alive',
             'Upgrade-Insecure-Requests': '1',
             'Sec-Fetch-Dest': 'document',
             'Sec-Fetch-Mode': 'navigate',
@@ -110,26 +289,30 @@ async def get_fresh_cookies():
             'DNT': '1'
         }
         
-        # First visit homepage to get initial cookies
-        response = session.get('https://netfree2.cc/home', headers=headers, timeout=10)
+        # Start every refresh from an empty jar, like a new browser session, so stale
+        # cookies are neither sent upstream nor mixed into the new cookie string
+        async with CLIENT_COOKIES_LOCK:
+            CLIENT.cookies.clear()
+            # First visit homepage to get initial cookies
+            response = await CLIENT.get('https://netfree2.cc/home', headers=headers, follow_redirects=True)
+            # The jar only holds this refresh's cookies; keying by name collapses duplicates
+            cookies = {cookie.name: cookie.value for cookie in CLIENT.cookies.jar}
+            cookie_string = '; '.join(f'{name}={value}' for name, value in cookies.items())
         
         if response.status_code == 200:
-            # Extract the cookies as a string
-            cookie_dict = session.cookies.get_dict()
-            cookie_string = '; '.join([f'{k}={v}' for k, v in cookie_dict.items()])
-            logger.info(f"Successfully obtained fresh cookies: {cookie_string}")
+            logger.info("Successfully obtained fresh cookies (%s chars)", len(cookie_string))
             
             # Store in cache
-            COOKIES_CACHE['latest'] = cookie_string
+            await store_latest_cookies(cookie_string)
             return cookie_string
         else:
-            logger.warning(f"Failed to get fresh cookies, status code: {response.status_code}")
+            logger.warning("Failed to get fresh cookies, status code: %s", response.status_code)
             return COOKIES_CACHE['default']
     except Exception as e:
-        logger.error(f"Error getting fresh cookies: {str(e)}")
+        logger.error("Error getting fresh cookies: %s", e)
         return COOKIES_CACHE['default']
 
-ROXIES = [
+PROXIES = (
     "http://40.76.69.94:8080",
     "http://88.99.209.189:1234",
     "http://67.43.228.251:21621",
@@ -143,85 +326,168 @@ ROXIES = [
     "http://72.10.160.173:11025",
     "http://91.243.226.71:8080",
     "http://44.220.205.79:8080"
-]
+)
+
+# One pooled client per proxy so keep-alive connections are never reused across proxies
+PROXY_CLIENTS: Dict[str, httpx.AsyncClient] = {}
+
+# Reachable proxies as (rtt, proxy), fastest first; refreshed by probe_proxies_loop
+LIVE_PROXIES: List[tuple] = []
+LIVE_PROXY_TOP_K = 5
+PROXY_PROBE_INTERVAL = 60
+PROXY_PROBE_TIMEOUT = 3.0
 
 def get_random_proxy():
-    return random.choice(PROXIES)
-
-def make_request(id: str, t: str, tm: str, use_fresh_cookies: bool = False):
-    url = f'https://netfree2.cc/playlist.php?id={id}&t={t}&tm={tm}'
-    logger.info(f"Making request to {url}")
-
-    headers = {
-        'Accept': '*/*',
-        'Accept-Encoding': 'gzip, deflate, br',
-        'Accept-Language': 'en-US,en;q=0.5',
-        'Connection': 'keep-alive',
-        'DNT': '1',
-        'Host': 'netfree2.cc',
-        'Referer': 'https://netfree2.cc/home',
-        'Sec-Fetch-Dest': 'empty',
-        'Sec-Fetch-Mode': 'cors',
-        'Sec-Fetch-Site': 'same-origin',
-        'TE': 'trailers',
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:124.0) Gecko/20100101 Firefox/124.0'
-    }
+    # Fall back to the full list until the first probe round has completed
+    if LIVE_PROXIES:
+        return random.choice(LIVE_PROXIES[:LIVE_PROXY_TOP_K])[1]
+    return random.choices(PROXIES, k=1)[0]
+
+def get_random_proxies(count: int) -> List[str]:
+    pool = [proxy for _, proxy in LIVE_PROXIES[:LIVE_PROXY_TOP_K]] or PROXIES
+    return random.sample(pool, min(count, len(pool)))
+
+def get_proxy_client(proxy: str) -> httpx.AsyncClient:
+    client = PROXY_CLIENTS.get(proxy)
+    if client is None:
+        client = httpx.AsyncClient(transport=build_transport(50, 50, proxy), timeout=10.0)
+        PROXY_CLIENTS[proxy] = client
+    return client
+
+async def probe_proxy(proxy: str):
+    start = time.monotonic()
+    try:
+        await get_proxy_client(proxy).head('https://netfree2.cc/home', timeout=PROXY_PROBE_TIMEOUT)
+    except Exception as e:
+        logger.debug("Proxy %s failed health check: %s", proxy, e)
+        return None
+    return time.monotonic() - start, proxy
+
+async def probe_proxies_loop():
+    """Periodically probe every proxy and keep LIVE_PROXIES sorted by round-trip time"""
+    while True:
+        results = await asyncio.gather(*(probe_proxy(proxy) for proxy in PROXIES))
+        LIVE_PROXIES[:] = sorted(result for result in results if result is not None)
+        logger.info("Proxy health check: %s/%s proxies reachable", len(LIVE_PROXIES), len(PROXIES))
+        await asyncio.sleep(PROXY_PROBE_INTERVAL)
+
+async def build_playlist_request(id: str, t: str, tm: str, use_fresh_cookies: bool = False):
+    url = f'https://{PLAYLIST_HOST}{PLAYLIST_PATH}?id={id}&t={t}&tm={tm}'
+
+    headers = dict(PLAYLIST_HEADERS)
+    if use_fresh_cookies:
+        headers['Cookie'] = await get_latest_cookies() or DEFAULT_COOKIE
+    else:
+        headers['Cookie'] = DEFAULT_COOKIE
 
-    if not use_fresh_cookies:
-        headers['Cookie'] = 'user_token=c4e606ec3f66b93e8198a48c8c71e6b8; t_hash_t=4184321d319f63c93cff4c7588764623%3A%3A14b66f534e8c2fa68723668dead845ce%3A%3A1746367568%3A%3Ani; recentplay=81688854; 81688854=95%3A7065'
+    return url, headers
 
-    proxy = get_random_proxy()
-    logger.info(f"Using proxy: {proxy}")
+async def make_request(url: str, headers: Dict[str, str], proxy: Optional[str] = None):
+    logger.info("Making request to %s", url)
+
+    proxy = proxy or get_random_proxy()
+    logger.info("Using proxy: %s", proxy)
 
     try:
-        response = requests.get(url, headers=headers, proxies={"http": proxy, "https": proxy}, timeout=10)
-        logger.info(f"Response status code: {response.status_code}")
+        response = await get_proxy_client(proxy).get(url, headers=headers)
+        logger.info("Response status code: %s", response.status_code)
         return {
             'http_code': response.status_code,
             'response': response.content,
             'error': None
         }
-    except requests.exceptions.Timeout:
+    except httpx.TimeoutException:
         logger.error("Request timed out")
         return {
             'http_code': 408,
             'response': None,
             'error': "Request timed out"
         }
-    except requests.exceptions.ConnectionError as e:
-        logger.error(f"Connection error: {e}")
+    except httpx.TransportError as e:
+        logger.error("Connection error: %s", e)
         return {
             'http_code': 503,
             'response': None,
             'error': f"Connection error: {e}"
         }
     except Exception as e:
-        logger.error(f"Exception during request: {str(e)}", exc_info=True)
+        logger.error("Exception during request: %s", e, exc_info=True)
         return {
             'http_code': 0,
             'response': None,
             'error': str(e)
         }
 
+# Number of proxies the same playlist request is raced through
+PROXY_RACE_SIZE = 3
+
+async def race_requests(id: str, t: str, tm: str, use_fresh_cookies: bool = False):
+    """Send the request through several proxies at once and keep the first upstream answer"""
+    # Built once and shared by every attempt; httpx copies the headers per request
+    url, headers = await build_playlist_request(id, t, tm, use_fresh_cookies)
+    tasks = [
+        asyncio.create_task(make_request(url, headers, proxy))
+        for proxy in get_random_proxies(PROXY_RACE_SIZE)
+    ]
+    result = None
+    try:
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                result = task.result()
+                # Any HTTP answer, error statuses included, came from upstream itself;
+                # only transport failures are worth waiting on the other proxies for
+                if result['error'] is None:
+                    return result
+        # Every attempt failed in transport, report the last one
+        return result
+    finally:
+        for task in tasks:
+            task.cancel()
+
+# Known file signatures, checked in order within each first-byte bucket
+MAGIC_SIGNATURES = [
+    (b'\xff\xd8', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+    (b'\x00\x00\x00\x1cftyp', 'video/mp4'),
+    (b'\x1aE\xdf\xa3', 'video/webm'),
+    (b'ID3', 'audio/mpeg'),
+    (b'\xff\xfb', 'audio/mpeg'),
+    (b'\xff\xf3', 'audio/mpeg'),
+    (b'PK\x03\x04', 'application/zip'),
+    (b'\x00asm', 'application/wasm'),
+    (b'dex\n', 'application/vnd.android.dex'),
+    (b'\xcf\xfa\xed\xfe', 'application/x-mach-binary'),
+]
+
+# Signatures grouped by their first byte so detection only compares the relevant few
+MAGIC_BY_FIRST_BYTE: Dict[int, List[tuple]] = {}
+for signature, mime_type in MAGIC_SIGNATURES:
+    MAGIC_BY_FIRST_BYTE.setdefault(signature[0], []).append((signature, mime_type))
+
 def detect_binary_format(data):
     if not isinstance(data, bytes):
         return 'text/plain'
 
-    if data.startswith(b'\xff\xd8'):
-        return 'image/jpeg'
-    elif data.startswith(b'\x89PNG\r\n\x1a\n'):
-        return 'image/png'
-    elif data.startswith(b'GIF87a') or data.startswith(b'GIF89a'):
-        return 'image/gif'
-    elif data.startswith(b'\x00\x00\x00\x1cftyp'):
-        return 'video/mp4'
-    elif data.startswith(b'\x1aE\xdf\xa3'):
-        return 'video/webm'
-    elif data.startswith(b'ID3') or data.startswith(b'\xff\xfb') or data.startswith(b'\xff\xf3'):
-        return 'audio/mpeg'
-    else:
+    if not data:
         return 'application/octet-stream'
 
+    for signature, mime_type in MAGIC_BY_FIRST_BYTE.get(data[0], ()):
+        if data.startswith(signature):
+            return mime_type
+    return 'application/octet-stream'
+
+# Control bytes that never appear in text payloads; only the head of the body is inspected
+CONTROL_BYTES = bytes(list(range(0x00, 0x09)) + [0x0B, 0x0C] + list(range(0x0E, 0x20)) + [0x7F])
+BINARY_SNIFF_SIZE = 4096
+
+def looks_binary(data: bytes) -> bool:
+    head = data[:BINARY_SNIFF_SIZE]
+    return len(head.translate(None, CONTROL_BYTES)) != len(head)
+
 def process_response(response_raw):
     if not response_raw:
         logger.warning("Empty response received")
@@ -230,15 +496,26 @@ def process_response(response_raw):
             'data': ''
         }
 
-    if isinstance(response_raw, bytes) and re.search(b'[\x00-\x08\x0B\x0C\x0E-\x1F\x7F]', response_raw):
+    if isinstance(response_raw, bytes) and looks_binary(response_raw):
         format_type = detect_binary_format(response_raw)
-        logger.info(f"Binary content detected, format: {format_type}")
+        logger.info("Binary content detected, format: %s", format_type)
         return {
             'type': 'binary',
             'format': format_type,
-            'data': base64.b64encode(response_raw).decode('utf-8')
+            'data': base64.b64encode(response_raw).decode('ascii')
         }
 
+    # orjson parses the raw bytes directly, so JSON bodies skip the separate UTF-8 decode
+    try:
+        decoded = orjson.loads(response_raw)
+        logger.info("Response successfully parsed as JSON")
+        return {
+            'type': 'json',
+            'data': decoded
+        }
+    except orjson.JSONDecodeError as e:
+        json_error = e
+
     if isinstance(response_raw, bytes):
         try:
             response_str = response_raw.decode('utf-8')
@@ -248,25 +525,16 @@ def process_response(response_raw):
             return {
                 'type': 'binary',
                 'format': 'application/octet-stream',
-                'data': base64.b64encode(response_raw).decode('utf-8')
+                'data': base64.b64encode(response_raw).decode('ascii')
             }
     else:
         response_str = response_raw
-        logger.info("Response was already a string, no decoding needed")
 
-    try:
-        decoded = json.loads(response_str)
-        logger.info("Response successfully parsed as JSON")
-        return {
-            'type': 'json',
-            'data': decoded
-        }
-    except (json.JSONDecodeError, TypeError) as e:
-        logger.warning(f"Failed to parse as JSON ({str(e)}), treating as plain text")
-        return {
-            'type': 'text',
-            'data': response_str
-        }
+    logger.warning("Failed to parse as JSON (%s), treating as plain text", json_error)
+    return {
+        'type': 'text',
+        'data': response_str
+    }
 
 @app.get("/refresh-cookies")
 async def refresh_cookies():
@@ -284,20 +552,42 @@ async def refresh_cookies():
             "message": f"Failed to refresh cookies: {str(e)}"
         }
 
-@app.get("/playlist/", response_model=ApiResponse)
-async def get_playlist(
-    id: str = Query(..., description="Content ID"),
-    t: str = Query(..., description="Title parameter"),
-    tm: str = Query(..., description="TM parameter"),
-    fresh_cookies: bool = Query(False, description="Use fresh cookies instead of saved ones")
-):
-    logger.info(f"Request received for ID: {id}, Title: {t}, TM: {tm}, Fresh cookies: {fresh_cookies}")
+# Upstream error pages are served with a 200 status; they are recognised by these markers
+ERROR_SENTINELS = (
+    (b"404 Not Found", 404, "Resource not found on netfree2.cc"),
+    (b"Access denied", 403, "Access denied - authentication required"),
+)
+ERROR_SNIFF_SIZE = 1024
+
+def find_error_sentinel(response_raw):
+    """Return (http_code, error_message) when the raw body is an upstream error page"""
+    if not isinstance(response_raw, bytes) or not response_raw:
+        return None
+
+    head = response_raw[:ERROR_SNIFF_SIZE]
+    # JSON payloads may legitimately contain the marker text
+    if head.lstrip()[:1] in (b'{', b'['):
+        return None
+
+    for marker, http_code, error_message in ERROR_SENTINELS:
+        if marker in head:
+            return http_code, error_message
+    return None
+
+async def fetch_playlist(id: str, t: str, tm: str, fresh_cookies: bool = False):
+    """Fetch, decode and wrap the upstream playlist in the API envelope, using the cache"""
+    # Parts are percent-encoded so a ':' inside the free-text title cannot collide keys
+    cache_key = f"pl:{quote(id, safe='')}:{quote(t, safe='')}:{quote(tm, safe='')}:{int(fresh_cookies)}"
+    cached = await cache_get(cache_key)
+    if cached is not None:
+        logger.info("Serving cached response for %s", cache_key)
+        return cached
     
     # If using fresh cookies, make sure we have them
-    if fresh_cookies and 'latest' not in COOKIES_CACHE:
+    if fresh_cookies and await get_latest_cookies() is None:
         await get_fresh_cookies()
     
-    request_result = make_request(id, t, tm, fresh_cookies)
+    request_result = await race_requests(id, t, tm, fresh_cookies)
     response_raw = request_result['response']
     http_code = request_result['http_code']
     error_message = request_result['error']
@@ -306,23 +596,24 @@ async def get_playlist(
     if (http_code >= 400 or error_message) and fresh_cookies:
         logger.info("Request failed, trying to refresh cookies and retry")
         await get_fresh_cookies()
-        request_result = make_request(id, t, tm, True)  # Use fresh cookies
+        request_result = await race_requests(id, t, tm, True)  # Use fresh cookies
         response_raw = request_result['response']
         http_code = request_result['http_code']
         error_message = request_result['error']
 
-    processed_data = process_response(response_raw)
-    if isinstance(processed_data, dict) and processed_data.get('type') == 'json':
-        if isinstance(processed_data['data'], list) and len(processed_data['data']) > 0:
-            processed_data['data'] = processed_data['data'][0]
-
-    if http_code == 200 and isinstance(processed_data, dict) and processed_data.get('type') == 'text':
-        if "404 Not Found" in processed_data.get('data', ""):
-            http_code = 404
-            error_message = "Resource not found on netfree2.cc"
-        elif "Access denied" in processed_data.get('data', ""):
-            http_code = 403
-            error_message = "Access denied - authentication required"
+    sentinel = find_error_sentinel(response_raw) if http_code == 200 else None
+    if sentinel is not None:
+        # Error pages skip the JSON/binary pipeline and are returned as text
+        http_code, error_message = sentinel
+        processed_data = {
+            'type': 'text',
+            'data': response_raw.decode('utf-8', 'replace')
+        }
+    else:
+        processed_data = process_response(response_raw)
+        if isinstance(processed_data, dict) and processed_data.get('type') == 'json':
+            if isinstance(processed_data['data'], list) and len(processed_data['data']) > 0:
+                processed_data['data'] = processed_data['data'][0]
 
     api_response = {
         'status': {
@@ -333,9 +624,35 @@ async def get_playlist(
         'data': processed_data
     }
 
-    logger.info(f"Returning response with status code: {http_code}, success: {api_response['status']['success']}")
+    # Only successful lookups are cached so transient proxy failures are retried
+    if api_response['status']['success']:
+        await cache_set(cache_key, api_response, PLAYLIST_CACHE_TTL)
+
+    logger.info("Returning response with status code: %s, success: %s", http_code, api_response['status']['success'])
     return api_response
 
+async def fetch_sources(id: str, t: str, tm: str, fresh_cookies: bool = False):
+    """Return just the playlist sources, or None when the response has none"""
+    # Built on fetch_playlist rather than under it because the shared cache stores the full envelope
+    data = (await fetch_playlist(id, t, tm, fresh_cookies))['data']
+
+    if isinstance(data, dict):
+        if data.get('type') == 'json' and isinstance(data.get('data'), dict):
+            return data['data'].get('sources')
+        elif 'sources' in data:
+            return data['sources']
+    return None
+
+@app.get("/playlist/", response_model=ApiResponse)
+async def get_playlist(
+    id: str = Query(..., description="Content ID"),
+    t: str = Query(..., description="Title parameter"),
+    tm: str = Query(..., description="TM parameter"),
+    fresh_cookies: bool = Query(False, description="Use fresh cookies instead of saved ones")
+):
+    logger.info("Request received for ID: %s, Title: %s, TM: %s, Fresh cookies: %s", id, t, tm, fresh_cookies)
+    return await fetch_playlist(id, t, tm, fresh_cookies)
+
 @app.get("/")
 async def root():
     return {
@@ -344,6 +661,7 @@ async def root():
         "example": "/playlist/?id=81900595&t=Mad%20Square&tm=14170286",
         "options": "Add fresh_cookies=true to use fresh cookies instead of saved ones",
         "cookie_refresh": "/refresh-cookies to manually refresh the cookie cache",
+        "stream": "/stream/ with the same parameters returns the raw upstream body, streamed",
         "debug": "Check server logs for detailed request/response information",
         "version": "1.0.2"
     }
@@ -362,37 +680,81 @@ async def get_hls_url(
     tm: str = Query(..., description="TM parameter"),
     fresh_cookies: bool = Query(False, description="Use fresh cookies instead of saved ones")
 ):
-    logger.info(f"HLS URL request for ID: {id}, Title: {t}, TM: {tm}")
-    response = await get_playlist(id, t, tm, fresh_cookies)
-
-    data = response['data']
-    sources = None
-
-    if isinstance(data, dict):
-        if data.get('type') == 'json' and isinstance(data.get('data'), dict):
-            sources = data['data'].get('sources')
-        elif 'sources' in data:
-            sources = data['sources']
+    logger.info("HLS URL request for ID: %s, Title: %s, TM: %s", id, t, tm)
+    sources = await fetch_sources(id, t, tm, fresh_cookies)
 
     if not sources:
         error_detail = "HLS URL not found in response"
         logger.error(error_detail)
         raise HTTPException(status_code=404, detail=error_detail)
 
-    hls_urls = [{
-        'quality': source.get('label', 'Unknown'),
-        'url': f"https://netfree2.cc{source['file']}" if not source['file'].startswith('http') else source['file'],
-        'type': source.get('type', 'Unknown'),
-        'default': source.get('default', False)
-    } for source in sources]
+    base = 'https://netfree2.cc'
+    hls_urls = []
+    for source in sources:
+        file = source['file']
+        hls_urls.append({
+            'quality': source.get('label', 'Unknown'),
+            'url': file if file.startswith('http') else base + file,
+            'type': source.get('type', 'Unknown'),
+            'default': source.get('default', False)
+        })
+
+    logger.info("Found %s HLS URLs", len(hls_urls))
+    return {'hls_urls': hls_urls}
+
+# Size of the chunks forwarded to the client when streaming upstream bodies
+STREAM_CHUNK_SIZE = 65536
+
+@app.get("/stream/")
+async def stream_playlist(
+    id: str = Query(..., description="Content ID"),
+    t: str = Query(..., description="Title parameter"),
+    tm: str = Query(..., description="TM parameter"),
+    fresh_cookies: bool = Query(False, description="Use fresh cookies instead of saved ones")
+):
+    """Forward the raw upstream body to the client as it arrives, without buffering or base64"""
+    logger.info("Stream request for ID: %s, Title: %s, TM: %s", id, t, tm)
+
+    url, headers = await build_playlist_request(id, t, tm, fresh_cookies)
+    proxy = get_random_proxy()
+    logger.info("Streaming %s using proxy: %s", url, proxy)
 
-    logger.info(f"Found {len(hls_urls)} HLS URLs")
-    return {"hls_urls": hls_urls}
+    client = get_proxy_client(proxy)
+    try:
+        response = await client.send(client.build_request("GET", url, headers=headers), stream=True)
+        # Reading the first chunk can fail the same ways as connecting, so it is mapped alike
+        try:
+            chunks = response.aiter_bytes(STREAM_CHUNK_SIZE)
+            first_chunk = await anext(chunks, b'')
+        except BaseException:
+            await response.aclose()
+            raise
+    except httpx.TimeoutException:
+        logger.error("Request timed out")
+        raise HTTPException(status_code=408, detail="Request timed out")
+    except httpx.TransportError as e:
+        logger.error("Connection error: %s", e)
+        raise HTTPException(status_code=503, detail=f"Connection error: {e}")
+
+    # Trust the upstream Content-Type, else sniff the magic bytes of the first chunk only
+    media_type = response.headers.get('content-type') or detect_binary_format(first_chunk[:16])
+    logger.info("Upstream status code: %s, media type: %s", response.status_code, media_type)
+
+    async def body():
+        try:
+            if first_chunk:
+                yield first_chunk
+            async for chunk in chunks:
+                yield chunk
+        finally:
+            await response.aclose()
+
+    return StreamingResponse(body(), status_code=response.status_code, media_type=media_type)
 
 @app.get("/example/", response_model=ApiResponse)
 async def example_request(fresh_cookies: bool = Query(False, description="Use fresh cookies instead of saved ones")):
     logger.info("Example request triggered")
-    return await get_playlist(
+    return await fetch_playlist(
         id="81900595",
         t="Mad Square",
         tm="14170286",
@@ -401,13 +763,15 @@ async def example_request(fresh_cookies: bool = Query(False, description="Use fr
 
 @app.get("/debug/headers/")
 async def debug_headers(request: Request):
+    latest_cookies = await get_latest_cookies()
     return {
         "headers": dict(request.headers),
         "client": request.client.host,
         "cookies_cache_status": {
             "default_cookie_length": len(COOKIES_CACHE['default']),
-            "has_fresh_cookies": 'latest' in COOKIES_CACHE,
-            "fresh_cookie_length": len(COOKIES_CACHE.get('latest', '')) if 'latest' in COOKIES_CACHE else 0
+            "has_fresh_cookies": latest_cookies is not None,
+            "fresh_cookie_length": len(latest_cookies) if latest_cookies is not None else 0,
+            "shared_cookie_pool": REDIS is not None
         }
     }
 
@@ -415,12 +779,36 @@ async def debug_headers(request: Request):
 @app.on_event("startup")
 async def startup_event():
     logger.info("Starting NetFree API server and initializing cookie cache")
+    app.state.proxy_probe_task = asyncio.create_task(probe_proxies_loop())
     try:
-        await get_fresh_cookies()
+        # Cookies already published by another worker (or a previous run) are reused as-is
+        if await get_latest_cookies() is None:
+            await get_fresh_cookies()
     except Exception as e:
-        logger.warning(f"Failed to get initial fresh cookies: {str(e)}")
+        logger.warning("Failed to get initial fresh cookies: %s", e)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    logger.info("Shutting down NetFree API server and closing HTTP clients")
+    app.state.proxy_probe_task.cancel()
+    await CLIENT.aclose()
+    if REDIS is not None:
+        await REDIS.aclose()
+    for client in PROXY_CLIENTS.values():
+        await client.aclose()
+    PROXY_CLIENTS.clear()
 
 if __name__ == "__main__":
     import uvicorn
     logger.info("Starting NetFree API server")
-    uvicorn.run(app, host="0.0.0.0", port=int(os.environ.get("PORT", 8000)))
+    # Requests are already logged by the middleware, so uvicorn's access log is disabled
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=int(os.environ.get("PORT", 8000)),
+        workers=int(os.environ.get("WORKERS", os.cpu_count() or 1)),
+        loop="uvloop",
+        http="httptools",
+        log_level="info",
+        access_log=False
+    )